@@ -38,10 +38,10 @@ def main(context):
         project_id = dest_container.parents.project
         project = fw.get_project(project_id)
 
-        output_dict = ar.acquire_rois(fw, project)
+        rows = ar.acquire_rois(fw, project)
         
         output_path = Path(context.output_dir)/f"{project.label}_ROI-Export_{datetime.now().strftime('%d-%m-%Y_%H-%M-%S')}.csv"
-        ar.save_csv(output_dict, output_path)
+        ar.save_csv(rows, output_path)
 
 
     
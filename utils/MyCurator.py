@@ -1,20 +1,34 @@
-import copy
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import functools
 import logging
-from pathlib import Path
-from pprint import pprint
-import json
+import threading
 
-import pydicom
 from pydicom.filebase import DicomBytesIO
+from pydicom.filereader import read_partial
+from pydicom.tag import Tag
 
 import flywheel
 
 from flywheel_gear_toolkit.utils.curator import HierarchyCurator
 from flywheel_gear_toolkit.utils.datatypes import Container
 
-POSSIBLE_KEYS = ["ohifViewer", "roi"]
 OHIF_KEY = "ohifViewer"
-SUPPORTED_ROIS = ["RectangleRoi", "EllipticalRoi"]
+ROI_KEY = "roi"
+# Max number of acquisition reloads and zipped dicom member downloads in flight at
+# once.  One pool is shared by every container being curated, see `MAX_WORKERS` in
+# utils/acquire_ROIs.py.
+IO_WORKERS = 6
+# Status core responds with when asked for the zip info of a file that isn't a zip
+NOT_ZIP_STATUS = 400
+# Max number of fetched sessions, zipped files and ROI dicom lookups whose results are
+# kept.  The oldest entries are dropped first, so memory doesn't grow with the project.
+SESSION_CACHE_SIZE = 64
+ZIP_CACHE_SIZE = 256
+DICOM_FILE_CACHE_SIZE = 4096
+SUPPORTED_ROIS = frozenset(("RectangleRoi", "EllipticalRoi"))
+# The "roi" namespace uses lowerCamelCase tool types for the same ROI's
+SUPPORTED_ROIS_LOWER = frozenset(("rectangleRoi", "ellipticalRoi"))
 EXPORT_VALUES = [""]
 KNOWN_EXTENSIONS = {
     ".dcm": "DICOM",
@@ -23,31 +37,40 @@ KNOWN_EXTENSIONS = {
     ".nii": "NIFTI",
 }
 
-OUTPUT_TEMPLATE = {
-    "group": [],
-    "project": [],
-    "subject": [],
-    "session": [],
-    "acquisition": [],
-    "file": [],
-    "dicom member": [],
-    "file type": [],
-    "location": [],
-    "description": [],
-    "x min": [],
-    "x max": [],
-    "y min": [],
-    "y max": [],
-    "user origin": [],
-    "roi type": [],
-    "area": [],
-    "count": [],
-    "max": [],
-    "mean": [],
-    "min": [],
-    "stdDev": [],
-    "variance": []
-}
+OUTPUT_COLUMNS = (
+    "group",
+    "project",
+    "subject",
+    "session",
+    "acquisition",
+    "file",
+    "dicom member",
+    "file type",
+    "location",
+    "description",
+    "x min",
+    "x max",
+    "y min",
+    "y max",
+    "user origin",
+    "roi type",
+    "area",
+    "count",
+    "max",
+    "mean",
+    "min",
+    "stdDev",
+    "variance",
+)
+
+# (0008,0018) SOP Instance UID, the only dicom element the gear needs to read
+SOP_INSTANCE_UID_TAG = Tag(0x0008, 0x0018)
+
+# The cachedStats keys exported for each ROI, in the same order as `OUTPUT_COLUMNS`
+STAT_KEYS = ("area", "count", "max", "mean", "min", "stdDev", "variance")
+
+# Maps "_" back to "." when normalizing series uids from file metadata
+UID_TABLE = str.maketrans({"_": "."})
 
 
 log = logging.getLogger("export-ROI")
@@ -56,9 +79,113 @@ class NotZip(Exception):
     pass
 
 
+class BoundedCache(OrderedDict):
+    """ A dict that drops its oldest entries once it holds more than `maxsize`
+
+    Only used for results that are reused by containers curated close together in
+    the walk, e.g. the zip listing of a series is needed again by the other ROI's on
+    that series, which are all curated with the same session.
+    """
+
+    def __init__(self, maxsize):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+
+@functools.lru_cache(maxsize=4096)
+def get_file_type(file_name):
+    """ Returns the file type of a flywheel file based on its name
+
+    Known extensions are mapped through `KNOWN_EXTENSIONS`.  Anything else falls back
+    to the file's last two suffixes without the leading dot (e.g. "tar.gz").
+
+    Args:
+        file_name (str): the name of the file
+
+    Returns:
+        file_type (str): the type of the file
+
+    """
+
+    lower_name = file_name.lower()
+    for extension, file_type in KNOWN_EXTENSIONS.items():
+        if lower_name.endswith(extension):
+            return file_type
+
+    return ".".join(file_name.split(".")[1:][-2:])
+
+
+
+def _past_sop_instance_uid(tag, vr, length):
+    """ `read_partial` stop condition: stop at the first element after the SOP uid"""
+    return tag > SOP_INSTANCE_UID_TAG
+
+
+def read_sop_uid(raw_dcm):
+    """ Returns the SOPInstanceUID of a dicom without parsing the rest of the dataset
+
+    Elements are stored in tag order and the SOP uid is near the start, so reading
+    stops at the first element after it.
+
+    Args:
+        raw_dcm (DicomBytesIO): the raw dicom data stream
+
+    Returns:
+        sop_uid (str): the SOPInstanceUID of the dicom, or None if it has none
+
+    """
+
+    dcm = read_partial(
+        raw_dcm,
+        stop_when=_past_sop_instance_uid,
+        force=True,
+        specific_tags=[SOP_INSTANCE_UID_TAG],
+    )
+    return getattr(dcm, "SOPInstanceUID", None)
+
+
+def filter_study_series(files, study_uid, series_uid):
+    """ Returns the dicom files that match a given study and series UID
+
+    Args:
+        files (list): flywheel.FileEntry objects to filter
+        study_uid (str): the StudyInstanceUID to match
+        series_uid (str): the SeriesInstanceUID to match
+
+    Returns:
+        files (list): the matching dicom files
+
+    """
+
+    matches = []
+    for f in files:
+        if f.type != "dicom":
+            continue
+        info = f.info
+        if (
+            info.get("StudyInstanceUID") == study_uid
+            and info.get("SeriesInstanceUID") == series_uid
+        ):
+            matches.append(f)
+
+    return matches
+
 
 class ROICurator(HierarchyCurator):
-    def __init__(self, fw, **kwargs):
+    # The (validate, curate) method names for each container type
+    # ROI metadata only lives on sessions (ohifViewer) and files (ohifViewer/roi), so
+    # every other container type is skipped without validating or curating it.
+    _DISPATCH = {
+        "session": ("validate_session", "curate_session"),
+        "file": ("validate_file", "curate_file"),
+    }
+
+    def __init__(self, fw, project=None, **kwargs):
         super().__init__(**kwargs)
         self.config.multi = False
         self.config.depth_first = False
@@ -66,47 +193,159 @@ class ROICurator(HierarchyCurator):
         self.depth_first = self.config.depth_first
         self.fw = fw
 
+        # Labels of parent containers keyed by container type and id.  Many ROIs
+        # share the same parents, so each label is only fetched from flywheel once.
+        self._label_cache = {
+            "project": {},
+            "subject": {},
+            "session": {},
+            "acquisition": {},
+        }
+
+        # (group, project, subject, session, acquisition) labels keyed by the id of
+        # the container a file is on
+        self._hierarchy_cache = {}
+
+        # Sessions fetched for file level ROI's, keyed by id
+        self._session_cache = BoundedCache(SESSION_CACHE_SIZE)
+
+        # The walk is breadth first, so every session is curated before any of the
+        # files whose ohifViewer ROI's need the same listing and indexes again.  These
+        # three are kept for the whole run rather than bounded for that reason.
+
+        # Files of every acquisition in a session, keyed by session id
+        self._session_files_cache = {}
+
+        # {(StudyInstanceUID, SeriesInstanceUID): [files]} indexes keyed by session id
+        self._study_series_index_cache = {}
+
+        # {SeriesInstanceUID: file} indexes keyed by session id
+        self._uid_index_cache = {}
+
+        # Zip listings, and the {SOPInstanceUID: member path} read from them so far,
+        # keyed by (acquisition id, file name)
+        self._zip_info_cache = BoundedCache(ZIP_CACHE_SIZE)
+        self._sop_path_cache = BoundedCache(ZIP_CACHE_SIZE)
+        # Containers are curated from several threads at once.  The other caches
+        # are only ever read or assigned whole entries, but the {SOP uid: path}
+        # maps are filled in while other threads may be reading them.
+        self._sop_path_lock = threading.Lock()
+
+        # Dicom member names keyed by (container id, study, series, sop uid)
+        self._dicom_file_cache = BoundedCache(DICOM_FILE_CACHE_SIZE)
+
+        # Acquisition reloads and zip member reads from every container share this
+        # pool, so the number of concurrent requests stays capped at IO_WORKERS no
+        # matter how many containers are curated at once.
+        self._io_executor = ThreadPoolExecutor(max_workers=IO_WORKERS)
+
+        # The curator walks a single project, so its label is already known.
+        if project is not None:
+            self._label_cache["project"][project.id] = project.label
+
     def curate_container(self, container: Container):
-        """Curates a generic container and returns a python dictionary
+        """Curates a generic container and returns a list of ROI rows
         
-        The returned python dictionary contains any OhifViewer ROI metadata objects.
-        The returned dictionary is organized as follows:
+        The returned list contains one row for every OhifViewer ROI metadata object
+        found on the container.  Each row is a tuple of values ordered as
+        `OUTPUT_COLUMNS`:
         
-        output_dict = {"ROI TYPE": [<list of ROIs of that type>]}
+        rows = [(group, project, ..., variance), ...]
 
         Args:
             container (Container): A Flywheel container.
             
         Returns:
-            output_dict (dict):  A dictionary of ROI types found on the container
+            rows (list):  A list of ROI rows found on the container, or None if the
+                container failed validation or its type has no ROI's to curate
         """
         
-        if hasattr(container, "container_type"):
-            container_type = container.container_type
-            if container_type == "project":
-                if self.validate_project(container):
-                    output_dict = self.curate_project(container)
-            elif container_type == "subject":
-                if self.validate_subject(container):
-                    output_dict = self.curate_subject(container)
-            elif container_type == "session":
-                if self.validate_session(container):
-                    output_dict = self.curate_session(container)
-            elif container_type == "acquisition":
-                if self.validate_acquisition(container):
-                    output_dict = self.curate_acquisition(container)
-            elif container_type == "file":
-                if self.validate_file(container):
-                    output_dict = self.curate_file(container)
-            else:
-                if self.validate_analysis(container):
-                    output_dict = self.curate_analysis(container)
-        else:
-            # element is a file and has no children
-            if self.validate_file(container):
-                output_dict = self.curate_file(container)
+        # element is a file and has no children if it has no container type
+        container_type = getattr(container, "container_type", "file")
+        if container_type not in self._DISPATCH:
+            return None
+        validate_name, curate_name = self._DISPATCH[container_type]
+
+        rows = None
+        if getattr(self, validate_name)(container):
+            rows = getattr(self, curate_name)(container)
+
+        return rows
 
-        return output_dict
+
+    def close(self):
+        """ Shuts down the shared I/O pool, waiting for any requests still in flight"""
+        self._io_executor.shutdown(wait=True)
+
+
+    def prefetch_labels(self, project):
+        """ Loads the labels of every container in a project into the label cache
+
+        Rather than resolving each parent label with its own request the first time an
+        ROI references it, list every subject, session and acquisition in the project
+        up front.  Each listing is a paged query, so this costs a handful of requests
+        no matter how many containers the project has.
+
+        Args:
+            project (flywheel.Project): the flywheel project being exported
+
+        """
+
+        for subject in project.subjects.iter_find():
+            self._label_cache["subject"][subject.id] = subject.label
+
+        for session in project.sessions.iter_find():
+            self._label_cache["session"][session.id] = session.label
+
+        for acquisition in self.fw.acquisitions.iter_find(
+            f"parents.project={project.id}"
+        ):
+            self._label_cache["acquisition"][acquisition.id] = acquisition.label
+
+        log.debug(
+            "Prefetched labels for %s containers",
+            sum(len(cache) for cache in self._label_cache.values()),
+        )
+
+
+    def _get_label(self, container_type, container_id):
+        """ Returns the label of a flywheel container, fetching it only once per id
+
+        Args:
+            container_type (str): one of "project", "subject", "session", "acquisition"
+            container_id (str): the flywheel id of the container
+
+        Returns:
+            label (str): the label of the container
+
+        """
+        cache = self._label_cache[container_type]
+        label = cache.get(container_id)
+        if label is None:
+            getter = getattr(self.fw, f"get_{container_type}")
+            label = getter(container_id).label
+            cache[container_id] = label
+        return label
+
+
+    def _get_session(self, session_id):
+        """ Returns a flywheel session, fetching it only once per id
+
+        Every file in a session that has ROI metadata needs its parent session, so
+        keep the first copy fetched rather than getting it again for each file.
+
+        Args:
+            session_id (str): the flywheel id of the session
+
+        Returns:
+            session (flywheel.Session): the session
+
+        """
+        session = self._session_cache.get(session_id)
+        if session is None:
+            session = self.fw.get_session(session_id)
+            self._session_cache[session_id] = session
+        return session
 
 
     def get_file_hierarchy(self, file):
@@ -116,8 +355,7 @@ class ROICurator(HierarchyCurator):
         on.  These values are later saved in an output.csv file.
         
         Args:
-            container (flywheel.models.FileReference): The flywheel container that 
-            is the direct parent of the file
+            file (flywheel.FileEntry): The flywheel file to build the hierarchy for
 
         Returns:
             group_label (str): the label of the file's parent group
@@ -128,59 +366,149 @@ class ROICurator(HierarchyCurator):
 
         """
         
+        # Both of these are already loaded on the file, so every label below is either
+        # read straight off the direct parent or served from the label cache.
+        parent = file.parent
+
+        # All files in a container share its hierarchy, so build it once per container.
+        hierarchy = self._hierarchy_cache.get(parent.id)
+        if hierarchy is not None:
+            return hierarchy
+
+        parents = parent.parents
+
         # The highest level a file can be on is a project,  so it will ALWAYS have a 
         # parent group and project:
-        group_label = file.parent.parents.group
-        project_id = file.parent.parents.project
-        if project_id:
-            project_label = self.fw.get_project(project_id).label
-        else:
-            if file.parent.container_type == "project":
-                project_label = file.parent.label
-            else:
-                project_label = None
-        
-        
-        # Check if the file has a parent subject and extract label if so
-        subject_id = file.parent.parents.subject
-        if subject_id:
-            subject_label = self.fw.get_subject(subject_id).label
-        else:
-            if file.parent.container_type == "subject":
-                subject_label = file.parent.label
-            else:
-                subject_label = None
-        
-        # Check if file has a parent session and extract label of so
-        session_id = file.parent.parents.session
-        if session_id:
-            session_label = self.fw.get_session(session_id).label
-        else:
-            if file.parent.container_type == "session":
-                session_label = file.parent.label
-            else:
-                session_label = None
-        
-        # Check if the file has a parent acquisition and extract label
-        acquisition_id = file.parent.parents.acquisition
-        if acquisition_id:
-            acquisition_label = self.fw.get_acquisition(acquisition_id).label
-        else:
-            if file.parent.container_type == "acquisition":
-                acquisition_label = file.parent.label
+        hierarchy = [parents.group]
+
+        for container_type in ("project", "subject", "session", "acquisition"):
+            # Check if the file has a parent at this level and extract label if so
+            container_id = getattr(parents, container_type)
+            if container_id:
+                hierarchy.append(self._get_label(container_type, container_id))
+            elif parent.container_type == container_type:
+                hierarchy.append(parent.label)
             else:
-                acquisition_label = None
+                hierarchy.append(None)
 
-        return (
-            group_label,
-            project_label,
-            subject_label,
-            session_label,
-            acquisition_label,
-        )
+        hierarchy = tuple(hierarchy)
+        self._hierarchy_cache[parent.id] = hierarchy
+        return hierarchy
+
+
+    def _reload_acquisitions(self, session):
+        """ Returns every acquisition in a session, reloaded so their files are populated
+
+        Each reload is its own request, so they are issued concurrently on the shared
+        I/O pool.
+
+        Args:
+            session (flywheel.Session): The flywheel session to list acquisitions for
+
+        Returns:
+            acquisitions (list): the reloaded flywheel.Acquisition objects
+
+        """
+
+        acquisitions = session.acquisitions()
+        if not acquisitions:
+            return []
+
+        return list(self._io_executor.map(lambda acq: acq.reload(), acquisitions))
+
+
+    def _get_session_files(self, session):
+        """ Returns every file in every acquisition of a session, fetched once per session
+
+        Both matching ROI's to files and locating their dicom members need the full
+        list of a session's files, so they share this one listing.
+
+        Args:
+            session (flywheel.Session): The flywheel session to list files for
+
+        Returns:
+            files (list): the session's flywheel.FileEntry objects
+
+        """
+
+        files = self._session_files_cache.get(session.id)
+        if files is None:
+            files = []
+            for acq in self._reload_acquisitions(session):
+                files.extend(acq.files)
+            self._session_files_cache[session.id] = files
+        return files
+
+
+    def _get_study_series_index(self, session):
+        """ Returns the dicom files of a session grouped by study and series UID
+
+        Args:
+            session (flywheel.Session): The flywheel session that has ROI metadata.
+
+        Returns:
+            index (dict): a dictionary of {(StudyInstanceUID, SeriesInstanceUID):
+                [flywheel.FileEntry]}
+
+        """
+
+        index = self._study_series_index_cache.get(session.id)
+        if index is not None:
+            return index
+
+        index = {}
+        for f in self._get_session_files(session):
+            if f.type != "dicom":
+                continue
+            info = f.info
+            key = (info.get("StudyInstanceUID"), info.get("SeriesInstanceUID"))
+            index.setdefault(key, []).append(f)
+
+        self._study_series_index_cache[session.id] = index
+        return index
+
+
+    def _get_uid_index(self, session):
+        """ Returns a mapping of SeriesInstanceUID to dicom file for a given session
+
+        Every ROI in a session is matched to its file by series instance UID.  Listing
+        and reloading all of the session's acquisitions is expensive, so this is done
+        once per session rather than once per ROI, and the index is kept for any file
+        level ROI's in the same session.
+
+        Args:
+            session (flywheel.Session): The flywheel session that has ROI metadata.
+
+        Returns:
+            uid_index (dict): a dictionary of {SeriesInstanceUID: flywheel.FileEntry}
+
+        """
+
+        uid_index = self._uid_index_cache.get(session.id)
+        if uid_index is not None:
+            return uid_index
+
+        uid_index = {}
+        for f in self._get_session_files(session):
+            # Get dicoms only
+            if f.type != "dicom":
+                continue
+
+            # If they have metadata (THEY MUST), index the file by its series
+            # instance uid so the ROI's can be matched to it.
+            uid = f.info.get("SeriesInstanceUID", "").translate(UID_TABLE)
+            if not uid:
+                continue
+            if uid in uid_index:
+                log.warning(f"Multiple matches for series uid {uid} ")
+                continue
+            uid_index[uid] = f
+
+        self._uid_index_cache[session.id] = uid_index
+        return uid_index
 
 
-    def get_roi_hierarchy(self, session, roi):
+    def get_roi_hierarchy(self, uid_index, roi):
         """ Returns the hierarchy paths for each file that has an ROI within a given
         session on flywheel
 
@@ -188,7 +516,8 @@ class ROICurator(HierarchyCurator):
         on.  These values are later saved in an output.csv file.
 
         Args:
-            session (flywheel.Session): The flywheel session that has ROI metadata.
+            uid_index (dict): the session's {SeriesInstanceUID: file} mapping, as
+                returned by `_get_uid_index`
             roi (dict): the specific ROI that we are generating a hierarchy for
 
         Returns:
@@ -209,31 +538,13 @@ class ROICurator(HierarchyCurator):
             log.error("No seriesInstanceUid for ROI")
             return [None]*7
         
-        # Get all the files contained in all the acquisitions in this session
-        acquisitions = session.acquisitions()
-        files = []
-        for a in acquisitions:
-            files.extend(a.reload().files)
-        
-        # Get dicoms only
-        files = [f for f in files if f.type == "dicom"]
-        
-        # If they have metadata (THEY MUST), match the series instance uid to find the 
-        # fild that this ROI is reffereing to.
-        my_file = [f for f in files if f.info.get("SeriesInstanceUID", "").replace('_', '.') == file_id]
-
-        if len(my_file) == 0:
+        my_file = uid_index.get(file_id)
+        if my_file is None:
             log.warning("No files match series instance UID")
             return [None]*7
 
-        elif len(my_file) > 1:
-            log.warning(f"Multiple matches for series uid {file_id} ")
-
-        my_file = my_file[0]
-
-        file_name = Path(my_file.name)
-        suffix = "".join(file_name.suffixes[-2:])
-        file_type = KNOWN_EXTENSIONS.get(suffix, suffix[1:])
+        file_name = my_file.name
+        file_type = get_file_type(my_file.name)
         
         # Now actually work backwards from this file to build the full hierarchy
         (
@@ -271,90 +582,36 @@ class ROICurator(HierarchyCurator):
             file (flywheel.FileEntry): the file that the metadata is attached to
 
         Returns:
-            output_dict (dict): an output dictionary with the desired ROI info.
+            rows (list): a list of ROI rows with the desired ROI info.
 
         """
 
-        # Create a copy of the output template.  This will be populated here.
-        output_dict = copy.deepcopy(OUTPUT_TEMPLATE)
+        # One row per ROI, ordered as `OUTPUT_COLUMNS`.  This will be populated here.
+        rows = []
+
+        # Every ROI in this namespace is on the same file, so the hierarchy and file
+        # type only need to be looked up once.
+        hierarchy = self.get_file_hierarchy(file)
+
+        file_name = file.name
+        file_type = get_file_type(file.name)
         
         for roi in roi_namespace:
             roi_type = roi.get("toolType")
             # Tool types aren't even formated the same as `SUPPORTED_ROIS` keys...
-            # I could add these to the list but again, idk.
-            if roi_type == "rectangleRoi" or roi_type == "ellipticalRoi":
+            if roi_type in SUPPORTED_ROIS_LOWER:
+                self._emit_row(
+                    rows, roi, roi_type, file, hierarchy, file_name, file_type
+                )
 
-                study_uid = roi.get("studyInstanceUid", roi.get("StudyInstanceUID"))
-                series_uid = roi.get("seriesInstanceUid", roi.get("SeriesInstanceUID"))
-                sop_uid = roi.get("sopInstanceUid", roi.get("SOPInstanceUID"))
-                
-               
-                dicom_member = self.get_roi_dicom_file(file, study_uid, series_uid,
-                                                       sop_uid)
-                
-                (
-                    group_label,
-                    project_label,
-                    subject_label,
-                    session_label,
-                    acquisition_label,
-                ) = self.get_file_hierarchy(file)
-
-                file_name = Path(file.name)
-
-                suffix = "".join(file_name.suffixes[-2:])
-                file_type = KNOWN_EXTENSIONS.get(suffix, suffix[1:])
-                
-                
-                (
-                    description,
-                    label,
-                    timestamp,
-                    x_start,
-                    y_start,
-                    x_end,
-                    y_end,
-                    user_origin,
-                    cached_stats
-                ) = self.process_generic_roi(roi)
-
-                output_dict["group"].append(group_label)
-                output_dict["project"].append(project_label)
-                output_dict["subject"].append(subject_label)
-                output_dict["session"].append(session_label)
-                output_dict["scquisition"].append(acquisition_label)
-
-                output_dict["file"].append(file_name)
-                output_dict["dicom member"].append(dicom_member)
-                output_dict["file type"].append(file_type)
-
-                output_dict["location"].append(label)
-                output_dict["description"].append(description)
-
-                output_dict["x min"].append(x_start)
-                output_dict["x max"].append(x_end)
-                output_dict["y min"].append(y_start)
-                output_dict["y max"].append(y_end)
-
-                output_dict["area"].append(cached_stats.get('area', 0))
-                output_dict["count"].append(cached_stats.get('count', 0))
-                output_dict["max"].append(cached_stats.get('max', 0))
-                output_dict["mean"].append(cached_stats.get('mean', 0))
-                output_dict["min"].append(cached_stats.get('min', 0))
-                output_dict["stdDev"].append(cached_stats.get('stdDev', 0))
-                output_dict["variance"].append(cached_stats.get('variance', 0))
-
-                output_dict["user origin"].append(user_origin)
-
-                output_dict["roi type"].append(roi_type)
-
-        return output_dict
+        return rows
 
 
     def process_namespace_ohifViewer(
         self,
         session,
-        roi_namespace
+        roi_namespace,
+        uid_index
     ):
         
         """
@@ -368,35 +625,25 @@ class ROICurator(HierarchyCurator):
         Args:
             session (flywheel.Session): The session that has the metadata ROI
             roi_namespace (dict): The actual metadata ROI from the session pre-extracted
+            uid_index (dict): The session's {SeriesInstanceUID: file} mapping
 
         Returns:
 
         """
         
-        # Create a copy of the output template.  This will be populated here.
-        output_dict = copy.deepcopy(OUTPUT_TEMPLATE)
+        # One row per ROI, ordered as `OUTPUT_COLUMNS`.  This will be populated here.
+        rows = []
         
         # Loop through the different ROI types in the namespace
-        for roi_type in roi_namespace.keys():
+        # Each value is the list of all ROI's of that type.
+        for roi_type, roi_type_namespace in roi_namespace.items():
     
             # If it's a supported ROI type, we will process
             if roi_type in SUPPORTED_ROIS:
                 
-                # This structure is a list of all ROI's of that type.
-                roi_type_namespace = roi_namespace.get(roi_type, {})
-                
                 # Loop through that list and process each one.
                 for roi in roi_type_namespace:
                     
-                    # These three pieces link the ROI to the file/slice (vital)
-                    study_uid = roi.get("studyInstanceUid", roi.get("StudyInstanceUID"))
-                    series_uid = roi.get("seriesInstanceUid", roi.get("SeriesInstanceUID"))
-                    sop_uid = roi.get("sopInstanceUid", roi.get("SOPInstanceUID"))
-                    
-                    # With these three, we will locate the exact dicom file that the 
-                    # session level ROI is referring to
-                    dicom_member = self.get_roi_dicom_file(session, study_uid, series_uid, sop_uid)
-                    
                     # This rebuilds the flywheel path (hierarchy) in human readable
                     # labels for this particular ROI
                     
@@ -408,59 +655,92 @@ class ROICurator(HierarchyCurator):
                         acquisition_label,
                         file_name,
                         file_type,
-                    ) = self.get_roi_hierarchy(session, roi)
+                    ) = self.get_roi_hierarchy(uid_index, roi)
                     
-                    # Now extract all the information we need from this ROI.
-                    (
-                        description,
-                        label,
-                        timestamp,
-                        x_start,
-                        y_start,
-                        x_end,
-                        y_end,
-                        user_origin,
-                        cached_stats
-                    ) = self.process_generic_roi(roi)
-
                     # If we don't have a group label, we didn't find a matching file.
                     # We must skip.
                     if group_label is None:
                         log.info('Unable to find matching file for ROI')
                         continue
-                    
-                    # populate the output_dictionary
-                    output_dict["group"].append(group_label)
-                    output_dict["project"].append(project_label)
-                    output_dict["subject"].append(subject_label)
-                    output_dict["session"].append(session_label)
-                    output_dict["acquisition"].append(acquisition_label)
-                    
-                    output_dict["file"].append(file_name)
-                    output_dict["dicom member"].append(dicom_member)
-                    output_dict["file type"].append(file_type)
-                    
-                    output_dict["location"].append(label)
-                    output_dict["description"].append(description)
-                    
-                    output_dict["x min"].append(x_start)
-                    output_dict["x max"].append(x_end)
-                    output_dict["y min"].append(y_start)
-                    output_dict["y max"].append(y_end)
-                    
-                    output_dict["area"].append(cached_stats.get('area', 0))
-                    output_dict["count"].append(cached_stats.get('count', 0))
-                    output_dict["max"].append(cached_stats.get('max', 0))
-                    output_dict["mean"].append(cached_stats.get('mean', 0))
-                    output_dict["min"].append(cached_stats.get('min', 0))
-                    output_dict["stdDev"].append(cached_stats.get('stdDev', 0))
-                    output_dict["variance"].append(cached_stats.get('variance', 0))
 
-                    output_dict["user origin"].append(user_origin)
+                    hierarchy = (
+                        group_label,
+                        project_label,
+                        subject_label,
+                        session_label,
+                        acquisition_label,
+                    )
+                    self._emit_row(
+                        rows, roi, roi_type, session, hierarchy, file_name, file_type
+                    )
+
+        return rows
 
-                    output_dict["roi type"].append(roi_type)
 
-        return output_dict
+    def _emit_row(
+        self,
+        rows,
+        roi,
+        roi_type,
+        fw_object,
+        hierarchy,
+        file_name,
+        file_type
+    ):
+        """
+        Extracts the info from a single ROI and appends it to `rows` as one output row
+        
+        Args:
+            rows (list): the list of ROI rows to append to
+            roi (dict): an OHIF viewer ROI metadata object
+            roi_type (str): the ROI type
+            fw_object (flywheel object): the file or session the ROI metadata is on,
+                used to locate the dicom file the ROI refers to
+            hierarchy (tuple): the group, project, subject, session and acquisition
+                labels of the file the ROI is on
+            file_name (str): the name of the file the ROI is on
+            file_type (str): the type of the file the ROI is on
+
+        """
+        
+        # These three pieces link the ROI to the file/slice (vital)
+        study_uid = roi.get("studyInstanceUid", roi.get("StudyInstanceUID"))
+        series_uid = roi.get("seriesInstanceUid", roi.get("SeriesInstanceUID"))
+        sop_uid = roi.get("sopInstanceUid", roi.get("SOPInstanceUID"))
+        
+        # With these three, we will locate the exact dicom file that the ROI is
+        # referring to
+        dicom_member = self.get_roi_dicom_file(fw_object, study_uid, series_uid, sop_uid)
+        
+        (
+            description,
+            label,
+            timestamp,
+            x_start,
+            y_start,
+            x_end,
+            y_end,
+            user_origin,
+            cached_stats
+        ) = self.process_generic_roi(roi)
+
+        rows.append(
+            (
+                *hierarchy,
+                file_name,
+                dicom_member,
+                file_type,
+                label,
+                description,
+                x_start,
+                x_end,
+                y_start,
+                y_end,
+                user_origin,
+                roi_type,
+                *[cached_stats.get(key, 0) for key in STAT_KEYS],
+            )
+        )
 
 
     def process_generic_roi(self, roi):
@@ -486,35 +766,31 @@ class ROICurator(HierarchyCurator):
         
         # Simply exctract the values we need
         description = roi.get("description")
-        label = roi.get("location")
         timestamp = roi.get("updatedAt")
         
         # Label can be two different things...It's weird, ok?
-        if label is None:
-            label = roi.get("label")
+        label = roi.get("location") or roi.get("label")
         
         # these are dictionaries that have information we need
         handles = roi.get("handles", {})
         start = handles.get("start", {})
         end = handles.get("end", {})
         
-        # Not sure why I don't just take the start and end...
-        exs = (start.get("x"), end.get("x"))
-        whys = (start.get("y"), end.get("y"))
-        x_start = min(exs)
-        y_start = min(whys)
-
-        x_end = max(exs)
-        y_end = max(whys)
+        # The start handle isn't always the top left corner, so order each axis.
+        x_start, x_end = start.get("x"), end.get("x")
+        if x_end < x_start:
+            x_start, x_end = x_end, x_start
+
+        y_start, y_end = start.get("y"), end.get("y")
+        if y_end < y_start:
+            y_start, y_end = y_end, y_start
         
         # Get the user
-        user_origin = roi.get("updatedById")
-        if user_origin is None:
-            user_origin = roi.get("flywheelOrigin", {}).get("id")
+        user_origin = roi.get("updatedById") or (roi.get("flywheelOrigin") or {}).get("id")
         
         # Retrieve the cahed stats (things like voxel value mean, min, max, std, etc)    
         cached_stats = roi.get('cachedStats', {})
-        log.debug(f"Cached stats:{cached_stats}")
+        log.debug("Cached stats:%s", cached_stats)
         
         return (
             description,
@@ -537,29 +813,33 @@ class ROICurator(HierarchyCurator):
             session (flywheel.Session): The flywheel Session to curate.
 
         Returns:
-            output_dict (dict)
+            rows (list): a list of ROI rows found on the session
         """
 
-        log.info(f"curating session {session.label}")
+        log.info("curating session %s", session.label)
         
-        # Copy the output dict template.  Could alternatively be done with dict
-        # comprehension.  Each item in output_dict is a list.  Each list will have
-        # one entry for every ROI
-        session = session.reload()
-        session_info = session.info
+        # MyWalker hands over the session it already reloaded to queue its children,
+        # so the info is normally loaded already.  Sessions that were only listed
+        # (e.g. walked with a callback that skips their children) still need a reload.
+        if not session.info:
+            session = session.reload()
+        session_info = session.info or {}
         
         # I've seen two keys used for this, "roi" and "ohifViewer".  'roi' was probably
         # Just for testing since I rarely see it, but here we are.
-        output_dict = {}
+        rows = []
         if OHIF_KEY in session_info:
-            log.debug(f"checking {OHIF_KEY} in {session_info.keys()}")
+            log.debug("checking %s in %s", OHIF_KEY, session_info.keys())
             # We're looking for the 'measurements' key.
             measurements = session_info.get(OHIF_KEY, {}).get("measurements", {})
             
             # Process this metadata structure
-            output_dict = self.process_namespace_ohifViewer(session, measurements)
+            uid_index = self._get_uid_index(session)
+            rows = self.process_namespace_ohifViewer(
+                session, measurements, uid_index
+            )
             
-        return output_dict
+        return rows
 
 
     def curate_file(self, file: flywheel.FileEntry):
@@ -570,107 +850,166 @@ class ROICurator(HierarchyCurator):
             file (flywheel.FileEntry): the file to curate
 
         Returns:
+            rows (list): a list of ROI rows found on the file
 
         """
         
-        log.info(f"curating file {file.name}")
-
-        output_dict = copy.deepcopy(OUTPUT_TEMPLATE)
+        rows = []
 
         # Files can have either rois or ohifViewers... I think files are being phased
         # out in general for having this ROI metadata in favor of always storing it at
         # the session level but idk.
-        for pk in POSSIBLE_KEYS:
-            log.debug(f"checking {pk} in {file.info.keys()}")
-            if pk in file.info:
-
-                log.debug("FOUND")
-                # If the namespace is "roi", the structure is slightly different
-                if pk == "roi":
-                    namespace = file.info.get(pk, {})
-                    output_dict = self.process_namespace_roi(
-                        namespace,
-                        file
-                    )
+        info = file.info or {}
 
-                    # for d in temp_dict:
-                    #     if d in output_dict:
-                    #         output_dict[d].extend(temp_dict[d])
-                    #     else:
-                    #         output_dict[d] = temp_dict[d]
-
-                elif pk == "ohifViewer":
-                    namespace = file.info.get(pk, {}).get("measurements", {})
-                    parent_ses = file.parent.parents.session
-                    if parent_ses is None:
-                        log.debug('file is not at acquisition level, skipping')
-                        continue
-                    session = self.fw.get_session(parent_ses)
-                    output_dict = self.process_namespace_ohifViewer(session, namespace)
+        # Most files carry neither, so bail out before doing any other work.
+        if OHIF_KEY not in info and ROI_KEY not in info:
+            return rows
+
+        log.info("curating file %s", file.name)
 
-                    # for d in temp_dict:
-                    #     if d in output_dict:
-                    #         output_dict[d].extend(temp_dict[d])
-                    #     else:
-                    #         output_dict[d] = temp_dict[d]
+        if OHIF_KEY in info:
+            parent_ses = file.parent.parents.session
+            if parent_ses is None:
+                log.debug('file is not at acquisition level, skipping')
+            else:
+                namespace = info[OHIF_KEY].get("measurements", {})
+                session = self._get_session(parent_ses)
+                uid_index = self._get_uid_index(session)
+                rows.extend(
+                    self.process_namespace_ohifViewer(session, namespace, uid_index)
+                )
+
+        # If the namespace is "roi", the structure is slightly different
+        if ROI_KEY in info:
+            rows.extend(self.process_namespace_roi(info[ROI_KEY], file))
 
-        return output_dict
+        return rows
 
     def match_zipped_dicom_member(self, acq, file, sop_uid):
         log.info('checking for zipped file')
 
-        try:
-            zip_info = acq.get_file_zip_info(file['name'])
-        except flywheel.ApiException as e:
+        # Many ROI's usually point at the same series, so the zip listing and every
+        # SOP uid read out of it are kept per file.
+        key = (acq.id, file['name'])
+        zip_info = self._zip_info_cache.get(key)
+        if zip_info is None:
+            try:
+                zip_info = acq.get_file_zip_info(file['name'])
+            except flywheel.ApiException as e:
+                # Only remember the answer when core says the file isn't a zip.  Any
+                # other error just fails this lookup, and the next ROI tries again.
+                if e.status != NOT_ZIP_STATUS:
+                    log.info('Could not get zip info for %s, opening raw', file['name'])
+                    raise NotZip
+                zip_info = False
+            self._zip_info_cache[key] = zip_info
+
+        if zip_info is False:
             log.info('File is not zipped, opening raw')
             raise NotZip
         log.info('zipped file detected')
 
-        # First pass - we will look for a simple string match in the zipped dicom:
-        match = [p['path'] for p in zip_info['members'] if sop_uid in p['path']]
+        sop_paths = self._sop_path_cache.setdefault(key, {})
+        if sop_uid in sop_paths:
+            return sop_paths[sop_uid]
 
-        if match:
-            dicom_file = match[0]
-            return dicom_file
-
-        # otherwise we have to pull each dicom, read the header, and compare SOP id's.
-        # Do this one zip member by one in the chance that you will find the correct
-        # file early on and you don't have to download everything:
+        # Look for a simple string match in the zipped dicom paths while collecting
+        # the members that may have to be read.  Members already read for an earlier
+        # ROI are in `sop_paths`, so skip those:
+        with self._sop_path_lock:
+            read_paths = set(sop_paths.values())
+        members = []
         for zip_member in zip_info["members"]:
+            path = zip_member['path']
+
+            if sop_uid in path:
+                return path
 
             if zip_member.get('size', 0) == 0:
-                log.debug(f"skipping directory {zip_member.get('path')}")
+                log.debug("skipping directory %s", path)
                 continue
 
-            try:
-                # This reads the raw dicom data stream into a pydicom object
-                #     (https://github.com/pydicom/pydicom/issues/653#issuecomment-449648844)
-                raw_dcm = DicomBytesIO(
-                    acq.read_file_zip_member(file['name'], zip_member.path))
+            if path not in read_paths:
+                members.append(path)
 
-                dcm = pydicom.dcmread(raw_dcm, force=True)
-
-            except Exception as e:
-                log.info(f"Error Loading dicom member '{zip_member.get('path', 'NO PATH PRESENT')}'.  Skipping")
-                continue
-
-            if dcm.SOPInstanceUID == sop_uid:
-                match = zip_member.path
+        # otherwise we have to pull each dicom, read the header, and compare SOP id's.
+        # The reads are independent requests, so run several at once on the shared
+        # I/O pool and stop as soon as the correct file turns up so we don't have to
+        # download everything.  Only IO_WORKERS reads are queued at a time, refilled
+        # as each one finishes, so one big zip doesn't hold up the reloads of every
+        # other container sharing the pool.  When the match turns up, the few reads
+        # still in flight finish in the background and their results are dropped.
+        unread = iter(members)
+        futures = {}
+
+        def submit_next():
+            path = next(unread, None)
+            if path is not None:
+                future = self._io_executor.submit(
+                    self.read_member_sop_uid, acq, file['name'], path
+                )
+                futures[future] = path
+
+        for _ in range(IO_WORKERS):
+            submit_next()
+
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            match = None
+            for future in done:
+                path = futures.pop(future)
+                member_sop_uid = future.result()
+                if member_sop_uid is None:
+                    continue
+
+                with self._sop_path_lock:
+                    sop_paths[member_sop_uid] = path
+                if member_sop_uid == sop_uid:
+                    match = path
+
+            if match is not None:
                 return match
 
+            for _ in done:
+                submit_next()
+
         return None
 
+    def read_member_sop_uid(self, acq, file_name, member_path):
+        """ Returns the SOPInstanceUID of a single dicom inside a zipped file
+
+        Args:
+            acq (flywheel.Acquisition): the acquisition the zipped file is on
+            file_name (str): the name of the zipped file
+            member_path (str): the path of the dicom within the zip archive
+
+        Returns:
+            sop_uid (str): the SOPInstanceUID of the dicom, or None if it can't be read
+
+        """
+
+        try:
+            # This reads the raw dicom data stream into a pydicom object
+            #     (https://github.com/pydicom/pydicom/issues/653#issuecomment-449648844)
+            raw_dcm = DicomBytesIO(acq.read_file_zip_member(file_name, member_path))
+            return read_sop_uid(raw_dcm)
+
+        except Exception as e:
+            log.info(f"Error Loading dicom member '{member_path}'.  Skipping")
+            return None
+
     def match_unzipped_dicom(self, file, sop_uid):
         log.info('uncompressed file detected')
 
         try:
             raw_dcm = DicomBytesIO(file.read())
-            dcm = pydicom.dcmread(raw_dcm, force=True)
+            file_sop_uid = read_sop_uid(raw_dcm)
         except Exception as e:
-            log.info(f"Error Loading dicom member '{zip_member.get('path', 'NO PATH PRESENT')}'.  Skipping")
+            log.info(f"Error Loading dicom file '{file['name']}'.  Skipping")
             return None
 
-        if dcm.SOPInstanceUID == sop_uid:
+        # A dicom without a readable SOP uid can't be matched to anything.
+        if file_sop_uid is not None and file_sop_uid == sop_uid:
             return file['name']
 
         return None
@@ -692,34 +1031,53 @@ class ROICurator(HierarchyCurator):
 
         """
 
+        # The same ROI can be reached more than once, e.g. when it's stored on both
+        # the session and one of its files.  Finding the dicom member can mean reading
+        # every member of a zip, so only do that once per ROI.
+        key = (fw_object.id, study_uid, series_uid, sop_uid)
+        dicom_file = self._dicom_file_cache.get(key)
+        if dicom_file is None:
+            dicom_file = self._find_roi_dicom_file(
+                fw_object, study_uid, series_uid, sop_uid
+            )
+            self._dicom_file_cache[key] = dicom_file
+
+        return dicom_file
+
+    def _find_roi_dicom_file(self, fw_object, study_uid, series_uid, sop_uid):
+        """ Does the actual search for `get_roi_dicom_file`, without caching."""
+
         container_type = fw_object.container_type
         if container_type == "file":
+            # The ROI metadata is on this very file, so there's nothing to match the
+            # study/series UID's against.  Only dicoms can hold the SOP uid though, so
+            # don't download anything else looking for it.
             log.debug('working on file')
-            acq = fw_object.parent
+            if fw_object.type != "dicom":
+                return "NO MATCHES FOUND"
             files = [fw_object]
             object_name = fw_object.name
 
         elif container_type == "acquisition":
             log.debug('working on acquisition')
-            files = fw_object.reload().files
+            # Only reload if the files (or their dicom metadata) weren't loaded yet
+            files = fw_object.files
+            if not files or any(f.type == "dicom" and not f.info for f in files):
+                files = fw_object.reload().files
+            files = filter_study_series(files, study_uid, series_uid)
             object_name = fw_object.label
 
         elif container_type == "session":
-            # first extract all files from the session.
+            # The session's dicoms are indexed by study/series UID once per session.
             log.debug('working on session')
-            files = []
-            for acq in fw_object.acquisitions():
-                acq = acq.reload()
-                files.extend(acq.files)
+            index = self._get_study_series_index(fw_object)
+            files = index.get((study_uid, series_uid), [])
             object_name = fw_object.label
 
         else:
             log.warning(f"container type {container_type} is invalid for ROI importer")
             return "INVALID CONTAINER TYPE"
 
-        # Filter by file type, study UID and series UID:
-        files = [f for f in files if f.type == "dicom" and f.info.get("StudyInstanceUID") == study_uid and f.info.get(
-            "SeriesInstanceUID") == series_uid]
         if len(files) == 0:
             log.warning(f"No dicom files found in session {object_name} with matching study/series UID "
                         f" Dicom Classifier must be run before ROI export.")
@@ -1,4 +1,5 @@
 import logging
+from typing import Callable, Optional
 
 from flywheel_gear_toolkit.utils.datatypes import Container
 from flywheel_gear_toolkit.utils import walker
@@ -7,34 +8,65 @@ log = logging.getLogger("export-ROI")
 
 
 class MyWalker(walker.Walker):
-    def queue_children(self, element: Container) -> None:
-        """Returns children of the element.
+    def next(self, callback: Optional[Callable[[Container], bool]] = None) -> Container:
+        """Returns the next element from the walker and adds its children.
+
+        Unlike the base walker, the element returned is the one reloaded while
+        queueing its children, so callers don't need to reload it a second time.
+
+        Args:
+            callback (Optional[Callable[[Container],bool]]).  Optional callback that takes
+                in the `next_element` and returns a boolean of whether or not to queue
+                its' children.  Defaults to None.
+
+        Returns:
+            Container: next element in the hierarchy.
+        """
+        to_queue = True
+        if self.depth_first:
+            next_element = self.deque.pop()
+        else:
+            next_element = self.deque.popleft()
+
+        if callback and callable(callback):
+            to_queue = callback(next_element)
+
+        if to_queue:
+            next_element = self.queue_children(next_element) or next_element
+
+        return next_element
+
+    def queue_children(self, element: Container) -> Optional[Container]:
+        """Queues children of the element.
 
         Args:
             element (Container): container to find children of.
 
+        Returns:
+            Container: the reloaded element, or None if it has no children.
+
         """
         container_type = element.container_type
 
         # No children of files
         if container_type == "file":
-            return
+            return None
 
         if container_type == "analysis":
-            return
+            return None
 
         element = element.reload()
         log.debug(
             f"Queueing children for {container_type} {element.label or element.code}"
         )
 
+        # Analyses are never curated for ROI's, so they aren't queued.
         self.deque.extend(element.files or [])
-
-        # Make sure that the analyses attribute is a list before iterating
-        self.deque.extend(element.analyses or [])
         if container_type == "project":
             self.deque.extend(element.subjects())
         elif container_type == "subject":
             self.deque.extend(element.sessions())
         elif container_type == "session":
             self.deque.extend(element.acquisitions())
+
+        return element
@@ -1,27 +1,20 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import csv
 import logging
-from pathlib import Path
-import json
-import pandas as pd
-import copy
+import os
 
-
-import flywheel
-
-from utils.MyCurator import ROICurator
+from utils.MyCurator import ROICurator, OUTPUT_COLUMNS
 from utils.MyWalker import MyWalker
-from flywheel_gear_toolkit.utils import curator
-from flywheel_gear_toolkit.utils.datatypes import Container
 
 
-POSSIBLE_KEYS = ["ohifViewer", "roi"]
-SUPPORTED_ROIS = ["RectangleRoi", "EllipticalRoi"]
-EXPORT_VALUES = [""]
-KNOWN_EXTENSIONS = {
-    ".dcm": "DICOM",
-    ".dicom": "DICOM",
-    ".nii.gz": "NIFTI",
-    ".nii": "NIFTI",
-}
+# Number of containers curated concurrently.  Curation is almost entirely waiting on
+# flywheel API requests, so threads overlap that latency.  Together with the
+# curator's shared pool of `IO_WORKERS` this stays within the 10 connections the
+# flywheel sdk keeps open, so requests don't churn connections.
+MAX_WORKERS = 4
+# Max number of containers submitted but not yet written out
+MAX_PENDING = 2 * MAX_WORKERS
 
 log = logging.getLogger(__name__)
 
@@ -30,59 +23,86 @@ def acquire_rois(fw, project):
     Acquire the ROI metadata from all the sessions in 'project'
     
     Using a walker and modified curator class, this function walks through a project,
-    looking for ohif viewer metadata containing ROI's.  These ROI's are packaged into
-    a python dictionary object and returned.
+    looking for ohif viewer metadata containing ROI's.  These ROI's are yielded one
+    row at a time as they are found, so the full export never has to be held in memory.
     
-    The returned output_dict is subdivided by ROI type.  The supported types are listed
-    above as the constant `SUPPORTED_ROIS`.  Each ROI object in the output_roi dict is
-    a list of all ROI's on that container of that type.
+    Each row is a tuple of values for a single ROI, ordered as `OUTPUT_COLUMNS`.  The
+    supported ROI types are listed in `utils.MyCurator.SUPPORTED_ROIS`.
     
     Args:
         fw (flywheel.Client): the flywheel client
         project (flywheel.Project): the flywheel project
 
-    Returns:
-        output_dict (dict): a dictionary of ROI objects
+    Yields:
+        row (tuple): a single ROI row
 
     """
 
-    curator = ROICurator(fw=fw)
+    curator = ROICurator(fw=fw, project=project)
+    try:
+        yield from _curate_project(curator, project)
+    finally:
+        curator.close()
+
+
+def _curate_project(curator, project):
+    """ Walks a project with `curator` and yields its ROI rows in walk order"""
+
+    curator.prefetch_labels(project)
     project_walker = MyWalker(project, depth_first=curator.depth_first)
 
-    output_dict = {}
+    # Containers are independent of each other, so curate them in a thread pool.
+    # `Executor.map` would submit the entire walk before returning anything, so
+    # containers are submitted through a bounded window instead and their results
+    # are taken oldest first, which keeps the csv output in walk order.
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        try:
+            for container in project_walker.walk():
+                pending.append(executor.submit(curator.curate_container, container))
+                if len(pending) >= MAX_PENDING:
+                    yield from _container_rows(pending.popleft().result())
+
+            while pending:
+                yield from _container_rows(pending.popleft().result())
+
+        finally:
+            # Don't curate the rest of the window if the export failed or stopped.
+            for future in pending:
+                future.cancel()
 
-    for container in project_walker.walk():
-        container_dict = curator.curate_container(container)
 
-        #container_dict = copy.deepcopy(container_dict)
-        # Every container from this curator will return a dict, but if the keys are
-        # empty, that means it didn't find any metadata matching OhifViewer Roi's on
-        # that container.  so if it exists and it's not None and it's not empty, it's
-        # a real ROI and we should process it.
-        log.debug("Container Dict:")
-        log.debug(container_dict)
-        if (container_dict and
-            container_dict.get("group") is not None and
-            container_dict.get("group") != []):
-            
-            for d in container_dict:
-                if d in output_dict:
-                    output_dict[d].extend(container_dict[d])
-                else:
-                    output_dict[d] = container_dict[d]
+def _container_rows(container_rows):
+    """ Returns the rows curated from one container, or an empty list if it had none"""
 
-    return output_dict
+    # Every container with ROI metadata returns a list of rows, one per ROI.
+    # If it's None or empty, no OhifViewer Roi's were found on that container.
+    log.debug("Container Rows: %s", container_rows)
+    return container_rows or []
 
 
-def save_csv(output_dict, path):
+def save_csv(rows, path):
     """
-    Saves the list of roi dictionaries into a .csv file
+    Streams roi rows into a .csv file
     Args:
-        output_dict (list): a list of ROI dictionaries
+        rows (iterable): an iterable of ROI rows, ordered as `OUTPUT_COLUMNS`
         path (PathLike): the location to save the .csv file to
 
     """
     
-    # Save without index since that clutters the csv and the ROI's will be unique
-    df = pd.DataFrame.from_dict(output_dict)
-    df.to_csv(path, index=False)
\ No newline at end of file
+    # Rows are written as they arrive rather than collected into a DataFrame first.
+    # They go to a temporary file that is only moved into place once every row is
+    # written, so a failed export doesn't leave a truncated csv behind.
+    tmp_path = f"{os.fspath(path)}.part"
+    try:
+        with open(tmp_path, "w", newline="") as csv_file:
+            # Plain "\n" line endings, the same as the csv's written with pandas before.
+            writer = csv.writer(csv_file, lineterminator="\n")
+            writer.writerow(OUTPUT_COLUMNS)
+            writer.writerows(rows)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    os.replace(tmp_path, path)